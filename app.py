@@ -1,38 +1,142 @@
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_from_directory, send_file, make_response
+from werkzeug.utils import safe_join
 import os
 import time
+import hashlib
+import hmac
+
+from profiler import SamplingProfiler
+import rollups
+from log_catalog import LogCatalog, BulkDeleteJob, SORT_KEYS
+import log_format
+from log_format import EXPORT_CHUNK_SIZE, parse_export_time, export_lines, export_stream
 
 app = Flask(__name__)
 
 LOG_DIR = "logs"
+ADMIN_TOKEN = os.environ.get("CANARIN_ADMIN_TOKEN", "")
+LOGS_PER_PAGE = 100
+MAX_LOGS_PER_PAGE = 1000
+MAX_DELETE_JOBS = 20
+VIEWER_DEFAULT_LINES = 20000
+VIEWER_MAX_LINES = 100000
+VIEWER_MAX_BYTES = 16 * 1024 * 1024
+
+profiler = SamplingProfiler("flask_app")
+# Ingest servers persist their rollups periodically; reloaded in the background when they change
+rollup_reader = rollups.RollupReader().start()
+
+catalog = LogCatalog(LOG_DIR)
+catalog.start_watching()
+delete_jobs = {}
 
 @app.route('/')
 def index():
-    log_files = os.listdir(LOG_DIR)
-    return render_template('index.html', log_files=log_files)
+    listing = catalog.query(per_page=LOGS_PER_PAGE)
+    fleet = rollup_reader.summary
+    return render_template('index.html', listing=listing, fleet=fleet)
+
+@app.route('/api/logs')
+def list_logs():
+    sort = request.args.get('sort', 'mtime')
+    order = request.args.get('order', 'desc')
+    if sort not in SORT_KEYS or order not in ('asc', 'desc'):
+        return jsonify({"success": False, "message": "Invalid sort"}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = min(MAX_LOGS_PER_PAGE, max(1, int(request.args.get('per_page', LOGS_PER_PAGE))))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid page"}), 400
+    return jsonify(catalog.query(request.args.get('q', ''), sort, order, page, per_page))
+
+def file_etag(stat, extra=""):
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}{extra}"
+
+def read_tail(f, size, max_lines, max_bytes=VIEWER_MAX_BYTES):
+    """Return ``(data, end)``: the last ``max_lines`` complete lines before ``size``.
+
+    The file is read backwards in EXPORT_CHUNK_SIZE blocks and never more than
+    ``max_bytes`` of it. A trailing partial line is left out and ``end`` is the
+    offset right after the last newline, so the live stream resumes there.
+    """
+    chunks = []
+    pos = size
+    limit = max(0, size - max_bytes)
+    newlines = 0
+    while pos > limit and newlines <= max_lines:
+        step = min(EXPORT_CHUNK_SIZE, pos - limit)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step)
+        newlines += chunk.count(b'\n')
+        chunks.append(chunk)
+    data = b''.join(reversed(chunks))
+    end = data.rfind(b'\n') + 1
+    lines = data[:end].split(b'\n')[:-1]
+    if pos > 0 and lines:
+        lines = lines[1:]  # started mid-line
+    lines = lines[-max_lines:]
+    data = b'\n'.join(lines) + b'\n' if lines else b''
+    return data, pos + end
+
+def viewer_retention():
+    # ?retain=N, then the viewer's remembered setting, then the default
+    value = request.args.get('retain') or request.cookies.get('logViewer.maxLines')
+    try:
+        return max(1, min(int(value), VIEWER_MAX_LINES))
+    except (TypeError, ValueError):
+        return VIEWER_DEFAULT_LINES
 
 @app.route('/logs/<filename>')
 def show_log(filename):
-    with open(os.path.join(LOG_DIR, filename)) as f:
-        content = f.read()
-    return render_template('log.html', log_content=content, filename=filename)
+    retain = viewer_retention()
+    with profiler.stage("read"):
+        with open(os.path.join(LOG_DIR, filename), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat, f"-{retain}")
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers={"ETag": f'"{etag}"'})
+            # Only the lines the viewer keeps are sent, not the whole file
+            data, end = read_tail(f, stat.st_size, retain)
+    content = data.decode('utf-8', errors='replace')
+    with profiler.stage("render"):
+        # log_size lets the viewer resume the live stream right after the rendered content
+        html = render_template('log.html', log_content=content, filename=filename, log_size=end, retain=retain,
+                               level_rules=log_format.viewer_rules())
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Cookie"
+    return response
 
 @app.route('/stream/<filename>')
 def stream_log(filename):
     filepath = os.path.join(LOG_DIR, filename)
+    try:
+        start_pos = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        start_pos = 0
     def event_stream():
-        last_pos = 0
+        last_pos = start_pos
         start_time=time.time()
         while True:
             try:
-                with open(filepath, 'r') as f:
+                with open(filepath, 'rb') as f:
                     f.seek(0, 2)
                     size = f.tell()
+                    if size < last_pos:
+                        # File was truncated or recreated
+                        last_pos = 0
                     if size > last_pos:
                         f.seek(last_pos)
-                        new_content = f.read()
-                        last_pos = f.tell()
-                        yield f"data: {new_content}\n\n"
+                        chunk = f.read(size - last_pos)
+                        # Only send complete lines; the event id is the byte offset to resume from
+                        end = chunk.rfind(b'\n')
+                        if end != -1:
+                            last_pos += end + 1
+                            lines = chunk[:end].decode('utf-8', errors='replace').replace('\r', '').split('\n')
+                            data = "\n".join(f"data: {line}" for line in lines)
+                            yield f"id: {last_pos}\n{data}\n\n"
                     time.sleep(0.5)
             except Exception as e:
                 print(f"Error in SSE stream: {e}")
@@ -41,26 +145,129 @@ def stream_log(filename):
                 break
     return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
 
+@app.route('/export/<filename>')
+def export_log(filename):
+    """Download a log, optionally sliced by time/level/text and gzipped on the fly.
+
+    Query parameters: ``start``/``end`` (ISO timestamps), ``level`` (comma-separated
+    viewer levels or tags, classified like the viewer does),
+    ``q`` (case-insensitive substring) and ``gzip=1``. Unfiltered, uncompressed
+    exports are served by send_file, which handles Range requests and uses
+    sendfile where the server supports it. Every export carries an ETag so
+    clients can revalidate with If-None-Match.
+    """
+    filepath = safe_join(LOG_DIR, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        return jsonify({"success": False, "message": f"Log {filename} not found"}), 404
+    try:
+        start = parse_export_time(request.args.get('start'))
+        end = parse_export_time(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid time: {e}"}), 400
+    levels = log_format.parse_levels(request.args.get('level', ''))
+    search = request.args.get('q', '').lower().encode()
+    use_gzip = request.args.get('gzip') == '1'
+
+    if not (start or end or levels or search or use_gzip):
+        # send_file resolves relative paths against app.root_path, not the working directory
+        return send_file(os.path.abspath(filepath), mimetype='text/plain', as_attachment=True,
+                         download_name=filename, conditional=True, etag=True, max_age=0)
+
+    stat = os.stat(filepath)
+    params = hashlib.sha1(request.query_string).hexdigest()[:12]
+    etag = file_etag(stat, f"-{params}")
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    lines = export_lines(filepath, stat.st_size, start, end, levels, search)
+    response = Response(stream_with_context(export_stream(lines, use_gzip)),
+                        mimetype='application/gzip' if use_gzip else 'text/plain')
+    download_name = f"{filename}.gz" if use_gzip else filename
+    response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    response.headers["Accept-Ranges"] = "none"
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(etag)
+    return response
+
 @app.route('/delete_log/<filename>', methods=['POST'])
 def delete_log(filename):
     try:
         os.remove(os.path.join(LOG_DIR, filename))
+        catalog.invalidate()
         return jsonify({"success": True, "message": f"Log {filename} deleted successfully"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 @app.route('/delete_all_logs', methods=['POST'])
 def delete_all_logs():
+    # Deletion runs in the background; poll /delete_jobs/<job_id> for progress.
+    # An optional ``prefix`` limits the deletion to matching files.
     try:
-        for filename in os.listdir(LOG_DIR):
-            os.remove(os.path.join(LOG_DIR, filename))
-        return jsonify({"success": True, "message": "All logs deleted successfully"})
+        running = next((job for job in delete_jobs.values() if job.running), None)
+        if running is not None:
+            return jsonify({"success": False, "message": "A delete job is already running", "job": running.progress()}), 409
+        job = BulkDeleteJob(catalog, request.values.get('prefix', '')).start()
+        delete_jobs[job.id] = job
+        while len(delete_jobs) > MAX_DELETE_JOBS:
+            delete_jobs.pop(next(iter(delete_jobs)))
+        return jsonify({"success": True, "message": "Delete started", "job": job.progress()}), 202
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route('/delete_jobs/<job_id>')
+def delete_job_status(job_id):
+    job = delete_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": f"Unknown job {job_id}"}), 404
+    return jsonify(job.progress())
+
+def admin_allowed():
+    # Admin endpoints stay disabled until CANARIN_ADMIN_TOKEN is configured
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+@app.route('/api/stats')
+def fleet_stats():
+    try:
+        minutes = int(request.args.get('minutes', 60))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid minutes"}), 400
+    if minutes == rollup_reader.summary["window_minutes"]:
+        return jsonify(rollup_reader.summary)
+    return jsonify(rollup_reader.store.fleet_summary(minutes=max(1, minutes)))
+
+@app.route('/api/stats/<imei>')
+def device_stats(imei):
+    resolution = request.args.get('resolution', 'minute')
+    if resolution not in rollups.RESOLUTIONS:
+        return jsonify({"success": False, "message": f"Unknown resolution {resolution}"}), 400
+    stats = rollup_reader.store.device_stats(imei, resolution)
+    if stats is None:
+        return jsonify({"success": False, "message": f"No stats for {imei}"}), 404
+    return jsonify(stats)
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    if not admin_allowed():
+        return jsonify({"success": False, "message": "Forbidden"}), 403
+    try:
+        seconds = float(request.args.get('seconds', 30))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid seconds"}), 400
+    duration = profiler.start(seconds)
+    if duration is None:
+        return jsonify({"success": False, "message": "Profiler already running"}), 409
+    return jsonify({"success": True, "message": f"Profiling for {duration:g}s", "seconds": duration, "output_dir": profiler.output_dir})
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_status():
+    if not admin_allowed():
+        return jsonify({"success": False, "message": "Forbidden"}), 403
+    return jsonify({"active": profiler.active, "last_output": profiler.last_output})
+
 @app.route('/static/<path:path>')
 def send_static(path):
     return send_from_directory('static', path)
 
 if __name__ == '__main__':
+    profiler.install_signal_handler()
     app.run(host='127.0.0.1', port=5000)
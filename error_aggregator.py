@@ -0,0 +1,180 @@
+import re
+import time
+from collections import OrderedDict, deque
+
+# Normalisation rules applied in order; each replaces a variable part of an
+# error line with a placeholder so repeats of the same error share a key.
+FINGERPRINT_RULES = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[\sT]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"), "<ts>"),
+    (re.compile(r"\d{2}[/-]\d{2}[/-]\d{4}\s\d{2}:\d{2}:\d{2}"), "<ts>"),
+    (re.compile(r"\b\d{2}:\d{2}:\d{2}(?:\.\d+)?\b"), "<ts>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<id>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{6,}\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(line):
+    """Normalise an error line by stripping timestamps, hex ids and numbers."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        line = pattern.sub(replacement, line)
+    return line.strip()[:200]
+
+
+class _Entry:
+    __slots__ = ("device", "key", "sample", "first_seen", "last_seen",
+                 "total", "buckets", "last_alert", "pending")
+
+    def __init__(self, device, key, sample, now, max_buckets):
+        self.device = device
+        self.key = key
+        self.sample = sample
+        self.first_seen = now
+        self.last_seen = now
+        self.total = 0
+        self.buckets = deque(maxlen=max_buckets)  # [bucket_start, count]
+        self.last_alert = now
+        self.pending = 0
+
+
+class ErrorAggregator:
+    """Counts error fingerprints per device over a sliding window.
+
+    ``record()`` returns True only for the first occurrence of a fingerprint
+    (or the first one after it has been quiet for a whole window), which is
+    when the caller should alert. Later repeats are accumulated and reported
+    by ``due_summaries()`` at most once per ``summary_interval``. Memory is
+    bounded by ``max_fingerprints``: the least recently seen entry without
+    unreported repeats is evicted first. Unreported repeats of an entry that
+    is evicted or restarted are queued as a summary so they are never lost;
+    queued summaries are merged per fingerprint and, past ``max_fingerprints``
+    of them, folded into a single catch-all summary.
+    """
+
+    def __init__(self, window=300, bucket=60, summary_interval=300, max_fingerprints=1000, top_n=10):
+        self.window = window
+        self.bucket = bucket
+        self.summary_interval = summary_interval
+        self.max_fingerprints = max_fingerprints
+        self.top_n = top_n
+        self._max_buckets = max(1, window // bucket + 1)
+        self._entries = OrderedDict()  # (device, key) -> _Entry
+        # (device, key) -> [count, since, until, sample] for entries that were evicted or restarted
+        self._flushed = OrderedDict()
+        self._overflow = None  # same fields, for flushed summaries beyond max_fingerprints
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, device, line, now=None):
+        now = time.time() if now is None else now
+        key = fingerprint(line)
+        entry = self._entries.get((device, key))
+        is_new = entry is None or now - entry.last_seen > self.window
+        if is_new:
+            if entry is not None:
+                self._flush(entry, entry.last_seen)
+            entry = _Entry(device, key, line, now, self._max_buckets)
+            self._entries[(device, key)] = entry
+        else:
+            entry.pending += 1
+        self._entries.move_to_end((device, key))
+
+        entry.total += 1
+        entry.last_seen = now
+        entry.sample = line
+        bucket_start = now - now % self.bucket
+        if entry.buckets and entry.buckets[-1][0] == bucket_start:
+            entry.buckets[-1][1] += 1
+        else:
+            entry.buckets.append([bucket_start, 1])
+
+        if len(self._entries) > self.max_fingerprints:
+            self._evict((device, key))
+        return is_new
+
+    def _flush(self, entry, now):
+        if not entry.pending:
+            return
+        flushed = self._flushed.get((entry.device, entry.key))
+        if flushed is None:
+            if len(self._flushed) >= self.max_fingerprints:
+                self._fold_oldest_flushed()
+            self._flushed[(entry.device, entry.key)] = [entry.pending, entry.last_alert, now, entry.sample]
+        else:
+            flushed[0] += entry.pending
+            flushed[2] = now
+            flushed[3] = entry.sample
+        entry.pending = 0
+
+    def _fold_oldest_flushed(self):
+        _, (count, since, until, sample) = self._flushed.popitem(last=False)
+        if self._overflow is None:
+            self._overflow = [count, since, until, sample]
+        else:
+            self._overflow[0] += count
+            self._overflow[1] = min(self._overflow[1], since)
+            self._overflow[2] = max(self._overflow[2], until)
+            self._overflow[3] = sample
+
+    def _evict(self, keep):
+        # Prefer the oldest entry with nothing left to report; never the one
+        # being recorded, or its next occurrence would alert again
+        victim = next((k for k, e in self._entries.items() if not e.pending and k != keep), None)
+        if victim is None:
+            victim = next(k for k in self._entries if k != keep)
+            entry = self._entries[victim]
+            self._flush(entry, entry.last_seen)
+        del self._entries[victim]
+
+    def window_count(self, entry, now=None):
+        now = time.time() if now is None else now
+        cutoff = now - self.window
+        return sum(count for start, count in entry.buckets if start + self.bucket > cutoff)
+
+    def due_summaries(self, now=None):
+        """Return entries with repeats not yet reported, and mark them reported.
+
+        Each item is ``(device, fingerprint, count, minutes, sample)`` where
+        ``count`` occurrences happened over the last ``minutes``; repeats that
+        overflowed the queue are reported under device ``"*"``. Entries that
+        have been quiet for a whole window are dropped afterwards.
+        """
+        now = time.time() if now is None else now
+        due = [
+            (device, key, count, max(1, round((until - since) / 60)), sample)
+            for (device, key), (count, since, until, sample) in self._flushed.items()
+        ]
+        self._flushed.clear()
+        if self._overflow is not None:
+            count, since, until, sample = self._overflow
+            due.append(("*", "<other errors>", count, max(1, round((until - since) / 60)), sample))
+            self._overflow = None
+        for entry in self._entries.values():
+            if entry.pending and now - entry.last_alert >= self.summary_interval:
+                minutes = max(1, round((now - entry.last_alert) / 60))
+                due.append((entry.device, entry.key, entry.pending, minutes, entry.sample))
+                entry.pending = 0
+                entry.last_alert = now
+        self._expire(now)
+        return due
+
+    def _expire(self, now):
+        stale = [k for k, e in self._entries.items()
+                 if not e.pending and now - e.last_seen > self.window]
+        for k in stale:
+            del self._entries[k]
+
+    def top(self, n=None, now=None):
+        """Return the ``n`` most frequent active fingerprints in the window."""
+        now = time.time() if now is None else now
+        n = self.top_n if n is None else n
+        ranked = []
+        for entry in self._entries.values():
+            count = self.window_count(entry, now)
+            if count:
+                ranked.append((count, entry.device, entry.key, entry.total))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return ranked[:n]
@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import bisect
+import threading
+from datetime import datetime
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # optional; the catalog falls back to polling the directory
+    Observer = None
+    FileSystemEventHandler = object
+
+ONLINE_SECONDS = 10 * 60
+SORT_KEYS = ("name", "mtime", "size")
+
+
+class _InvalidateHandler(FileSystemEventHandler):
+    # Only files appearing or disappearing invalidate the listing. Appends fire a
+    # modified event per write during ingest; sizes and mtimes are left to the TTL.
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def on_created(self, event):
+        self.catalog.invalidate()
+
+    def on_deleted(self, event):
+        self.catalog.invalidate()
+
+    def on_moved(self, event):
+        self.catalog.invalidate()
+
+
+class LogCatalog:
+    """Cached listing of the log directory with size, mtime and device state.
+
+    The directory is scanned with ``os.scandir`` and the result kept sorted
+    by name, so prefix searches are a bisect. The cache is rebuilt when it has
+    been invalidated (files created, deleted or moved, seen through
+    ``watchdog`` when it is installed, explicit ``invalidate()`` calls, or a
+    change of the directory mtime) or after ``ttl`` seconds, which is what
+    picks up sizes and mtimes of files being appended to. Rescans never
+    happen more often than every ``min_refresh`` seconds so a busy directory
+    does not cause a rescan per request.
+    """
+
+    def __init__(self, log_dir, ttl=5.0, min_refresh=1.0):
+        self.log_dir = log_dir
+        self.ttl = ttl
+        self.min_refresh = min_refresh
+        self._entries = []  # (name, size, mtime), sorted by name
+        self._names = []
+        self._loaded_at = 0.0
+        self._dir_mtime = None
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def start_watching(self):
+        """Invalidate when files are added or removed; returns False if watchdog is unavailable."""
+        if Observer is None or self._observer is not None:
+            return False
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            observer = Observer()
+            observer.schedule(_InvalidateHandler(self), self.log_dir, recursive=False)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            print(f"Log catalog watcher not started: {e}")
+            return False
+        self._observer = observer
+        return True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.log_dir) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.name, stat.st_size, stat.st_mtime))
+        entries.sort()
+        return entries
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        try:
+            dir_mtime = os.stat(self.log_dir).st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+        age = now - self._loaded_at
+        changed = self._dirty or dir_mtime != self._dir_mtime
+        if not force and age < self.ttl and not (changed and age >= self.min_refresh):
+            return
+        with self._lock:
+            if not force and self._loaded_at > now:
+                return  # another thread rescanned while we waited for the lock
+            self._dirty = False
+            entries = self._scan() if dir_mtime is not None else []
+            self._entries = entries
+            self._names = [name for name, _, _ in entries]
+            self._dir_mtime = dir_mtime
+            self._loaded_at = time.monotonic()
+
+    def entries(self, prefix="", force=False):
+        self._refresh(force)
+        entries, names = self._entries, self._names
+        if not prefix:
+            return entries
+        lo = bisect.bisect_left(names, prefix)
+        hi = bisect.bisect_left(names, prefix + "\uffff")
+        return entries[lo:hi]
+
+    def names(self, prefix="", force=False):
+        return [name for name, _, _ in self.entries(prefix, force)]
+
+    def query(self, prefix="", sort="mtime", order="desc", page=1, per_page=100):
+        entries = self.entries(prefix)
+        reverse = order == "desc"
+        if sort == "name":
+            if reverse:
+                entries = entries[::-1]
+        else:
+            key_index = 1 if sort == "size" else 2
+            entries = sorted(entries, key=lambda entry: entry[key_index], reverse=reverse)
+
+        total = len(entries)
+        pages = max(1, -(-total // per_page))
+        page = min(max(1, page), pages)
+        start = (page - 1) * per_page
+        now = time.time()
+        items = [
+            {
+                "name": name,
+                "device": name[:-4] if name.endswith(".log") else name,
+                "size": size,
+                "mtime": mtime,
+                "modified": datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                "state": "online" if now - mtime < ONLINE_SECONDS else "offline",
+            }
+            for name, size, mtime in entries[start:start + per_page]
+        ]
+        return {
+            "total": total,
+            "page": page,
+            "pages": pages,
+            "per_page": per_page,
+            "sort": sort,
+            "order": order,
+            "prefix": prefix,
+            "items": items,
+        }
+
+
+class BulkDeleteJob:
+    """Deletes a set of log files in a background thread, reporting progress."""
+
+    def __init__(self, catalog, prefix=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.catalog = catalog
+        self.prefix = prefix
+        self.state = "pending"
+        self.total = 0
+        self.deleted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = None
+        self.finished = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"delete-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self.state in ("pending", "running")
+
+    def _run(self):
+        self.state = "running"
+        self.started = time.time()
+        try:
+            # Bypass the cache so files created since the last scan are included
+            names = self.catalog.names(self.prefix, force=True)
+            self.total = len(names)
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.catalog.log_dir, name))
+                    self.deleted += 1
+                except FileNotFoundError:
+                    self.deleted += 1
+                except Exception as e:
+                    self.failed += 1
+                    if len(self.errors) < 20:
+                        self.errors.append(f"{name}: {e}")
+            self.state = "done" if not self.failed else "done_with_errors"
+        except Exception as e:
+            self.errors.append(str(e))
+            self.state = "failed"
+        finally:
+            self.finished = time.time()
+            self.catalog.invalidate()
+
+    def progress(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "prefix": self.prefix,
+            "total": self.total,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "percent": round(100 * (self.deleted + self.failed) / self.total, 1) if self.total else (0.0 if self.running else 100.0),
+            "errors": self.errors,
+            "started": self.started,
+            "finished": self.finished,
+        }
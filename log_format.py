@@ -0,0 +1,129 @@
+import re
+import zlib
+from datetime import datetime
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Patterns are kept compatible with JavaScript so the log viewer applies the
+# exact same rules (see viewer_rules()).
+TIMESTAMP_PATTERN = r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})'
+LEVEL_TAG_PATTERN = r' - \[([A-Za-z]+)\]'
+
+# Viewer level of each " - [LEVEL]" tag written by the log servers
+LEVEL_TAGS = {
+    "ERROR": "error",
+    "CRITICAL": "error",
+    "FATAL": "error",
+    "WARNING": "warning",
+    "WARN": "warning",
+    "INFO": "info",
+    "NOTICE": "info",
+    "DEBUG": "debug",
+    "TRACE": "debug",
+}
+# Case-insensitive fallbacks, tried in order, for timestamped lines without a tag
+KEYWORD_RULES = [
+    ("err|fatal", "error"),
+    ("warn", "warning"),
+    ("info", "info"),
+    ("debug|trace", "debug"),
+]
+VIEWER_LEVELS = ("error", "warning", "info", "debug")
+DEFAULT_LEVEL = "info"
+
+LOG_TIMESTAMP = re.compile(TIMESTAMP_PATTERN.encode())
+LOG_LEVEL = re.compile(LEVEL_TAG_PATTERN.encode())
+_TAG_LEVELS = {tag.encode(): level for tag, level in LEVEL_TAGS.items()}
+_KEYWORDS = [(re.compile(pattern.encode(), re.IGNORECASE), level) for pattern, level in KEYWORD_RULES]
+
+
+def classify(line, previous=DEFAULT_LEVEL):
+    """Return the viewer level (error/warning/info/debug) of a raw log line.
+
+    A timestamped line takes the level of its ``[LEVEL]`` tag, or of the first
+    matching keyword rule when it has no known tag. Lines without a timestamp
+    continue the entry above them and keep ``previous``.
+    """
+    if not LOG_TIMESTAMP.match(line):
+        return previous
+    tag = LOG_LEVEL.search(line)
+    if tag:
+        level = _TAG_LEVELS.get(tag.group(1).upper())
+        if level:
+            return level
+    for pattern, level in _KEYWORDS:
+        if pattern.search(line):
+            return level
+    return DEFAULT_LEVEL
+
+
+def parse_levels(value):
+    """Parse a comma-separated ``level`` parameter into viewer levels; tags such as WARN are accepted."""
+    levels = set()
+    for level in value.split(','):
+        level = level.strip()
+        if level:
+            levels.add(LEVEL_TAGS.get(level.upper(), level.lower()))
+    return levels
+
+
+def viewer_rules():
+    """The classification rules in the form used by the viewer's JavaScript."""
+    return {
+        "timestamp": TIMESTAMP_PATTERN,
+        "tag": LEVEL_TAG_PATTERN,
+        "tags": LEVEL_TAGS,
+        "keywords": KEYWORD_RULES,
+        "default": DEFAULT_LEVEL,
+    }
+
+
+def parse_export_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace(' ', 'T')).strftime('%Y-%m-%d %H:%M:%S').encode()
+
+
+def export_lines(filepath, size, start, end, levels, search):
+    # Yields the matching lines of the first ``size`` bytes; lines without a timestamp
+    # (continuations) follow the time range and level of the previous line
+    in_range = False
+    level = DEFAULT_LEVEL
+    with open(filepath, 'rb') as f:
+        remaining = size
+        for line in f:
+            if remaining <= 0:
+                break
+            line = line[:remaining]
+            remaining -= len(line)
+            stamp = LOG_TIMESTAMP.match(line)
+            if stamp:
+                in_range = (start is None or stamp.group(1) >= start) and (end is None or stamp.group(1) <= end)
+            elif start is None and end is None:
+                in_range = True
+            level = classify(line, level)
+            if not in_range or (levels and level not in levels):
+                continue
+            if search and search not in line.lower():
+                continue
+            yield line
+
+
+def export_stream(lines, use_gzip):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+    buffer = []
+    buffered = 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= EXPORT_CHUNK_SIZE:
+            chunk = b"".join(buffer)
+            buffer, buffered = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
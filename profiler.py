@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import threading
+import datetime
+import inspect
+from collections import Counter, defaultdict
+
+# ANSI color codes for terminal output
+RESET = '\033[0m'
+GREEN = '\033[92m'
+YELLOW = '\033[93m'
+RED = '\033[91m'
+
+PROFILE_DIR = os.environ.get("CANARIN_PROFILE_DIR", "profiles")
+DEFAULT_DURATION = float(os.environ.get("CANARIN_PROFILE_SECONDS", "30"))
+DEFAULT_INTERVAL = float(os.environ.get("CANARIN_PROFILE_INTERVAL", "0.01"))
+MIN_DURATION = 0.1
+MAX_DURATION = 600
+# Frames whose caller can change between samples, so their stacks are never cached
+_RESUMABLE = inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR
+
+
+class _StageTimer:
+    """Context manager that adds its elapsed time to a profiler stage.
+
+    Only takes the clock when a profiling session is running, so leaving the
+    timers in the hot path costs one attribute lookup per stage.
+    """
+
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        if self._profiler.active:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._start is not None:
+            self._profiler.record_stage(self._name, time.perf_counter() - self._start)
+            self._start = None
+        return False
+
+
+class SamplingProfiler:
+    """On-demand stack sampler writing collapsed-stack (flamegraph) output.
+
+    A background thread walks ``sys._current_frames()`` every ``interval``
+    seconds for ``duration`` seconds and counts each distinct stack. Stacks
+    belonging to a registered asyncio loop thread are prefixed with the name
+    of the task currently running on that loop. Each distinct stack of
+    ``(code, lineno)`` pairs is interned once and samples are counted by its
+    id; names are only formatted when the profile is written, to keep the
+    time spent holding the GIL per sample small.
+    """
+
+    def __init__(self, name, output_dir=PROFILE_DIR, interval=DEFAULT_INTERVAL):
+        self.name = name
+        self.output_dir = output_dir
+        self.interval = interval
+        self.active = False
+        self.last_output = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stacks = Counter()  # (task name or None, stack id) -> samples
+        self._stack_ids = {}  # ((code, lineno), ...) innermost first -> stack id
+        self._stages = defaultdict(lambda: [0, 0.0, 0.0])  # count, total, max
+        self._loops = {}  # thread id -> asyncio loop
+        self._last = {}  # thread id -> (top frame, lineno, stack id) of a thread blocked in plain calls
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def record_stage(self, name, elapsed):
+        with self._lock:
+            entry = self._stages[name]
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def register_loop(self, loop=None):
+        """Tag samples from the calling thread with the running asyncio task."""
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        self._loops[threading.get_ident()] = loop
+
+    def start(self, duration=None):
+        """Start a sampling session.
+
+        Returns the duration actually used (clamped to MIN_DURATION-MAX_DURATION), or None if
+        a session is already running.
+        """
+        duration = DEFAULT_DURATION if duration is None else float(duration)
+        duration = max(MIN_DURATION, min(duration, MAX_DURATION))
+        with self._lock:
+            if self.active:
+                return None
+            self.active = True
+            self._stacks = Counter()
+            self._stack_ids = {}
+            self._stages = defaultdict(lambda: [0, 0.0, 0.0])
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(duration,),
+            name=f"profiler-{self.name}",
+            daemon=True,
+        )
+        self._thread.start()
+        print(f"{YELLOW}Profiler started for {duration:g}s ({self.name}){RESET}", flush=True)
+        return duration
+
+    def _task_name(self, thread_id):
+        loop = self._loops.get(thread_id)
+        if loop is None or loop.is_closed():
+            return None
+        try:
+            task = asyncio.current_task(loop)
+        except RuntimeError:
+            return None
+        return task.get_name() if task is not None else "<loop>"
+
+    def _sample(self, own_id):
+        stacks = self._stacks
+        stack_ids = self._stack_ids
+        loops = self._loops
+        frames = sys._current_frames()
+        if len(self._last) >= len(frames):
+            # Forget threads that have exited so their frames can be freed
+            for thread_id in [t for t in self._last if t not in frames]:
+                del self._last[thread_id]
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            # A thread still in the same plain-function frame, on the same line, has the
+            # same callers as last time; idle connection threads are skipped this way
+            last = self._last.get(thread_id)
+            if last is not None and last[0] is frame and last[1] == frame.f_lineno:
+                stack_id = last[2]
+            else:
+                top = frame
+                stack = []
+                cacheable = True
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_flags & _RESUMABLE:
+                        cacheable = False
+                    stack.append((code, frame.f_lineno))
+                    frame = frame.f_back
+                stack_id = stack_ids.setdefault(tuple(stack), len(stack_ids))
+                if cacheable:
+                    self._last[thread_id] = (top, top.f_lineno, stack_id)
+                else:
+                    self._last.pop(thread_id, None)
+            task_name = self._task_name(thread_id) if thread_id in loops else None
+            stacks[(task_name, stack_id)] += 1
+
+    def _collapsed(self):
+        """Yield ``(collapsed stack, count)`` lines, root frame first."""
+        names = {}
+        stacks = {stack_id: stack for stack, stack_id in self._stack_ids.items()}
+        for (task_name, stack_id), count in self._stacks.most_common():
+            frames = []
+            stack = stacks[stack_id]
+            for code, lineno in reversed(stack):
+                name = names.get(code)
+                if name is None:
+                    name = names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                frames.append(f"{name}:{lineno})")
+            if task_name is not None:
+                frames.insert(0, f"task:{task_name}")
+            yield ";".join(frames), count
+
+    def _run(self, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        started = time.time()
+        try:
+            while time.monotonic() < deadline:
+                self._sample(own_id)
+                time.sleep(self.interval)
+        except Exception as e:
+            print(f"{RED}Profiler sampling error: {e}{RESET}", flush=True)
+        finally:
+            self._last.clear()  # do not keep frames (and their locals) alive
+            with self._lock:
+                self.active = False
+            self._write(started, duration)
+
+    def _write(self, started, duration):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.datetime.fromtimestamp(started).strftime('%Y%m%d-%H%M%S')
+            base = os.path.join(self.output_dir, f"{self.name}-{stamp}")
+            # Identical stacks may differ only by code object (reloaded modules), so merge by text
+            collapsed = Counter()
+            for stack, count in self._collapsed():
+                collapsed[stack] += count
+            with open(base + ".folded", "w") as f:
+                for stack, count in collapsed.most_common():
+                    f.write(f"{stack} {count}\n")
+            with self._lock:
+                stages = {
+                    name: {
+                        "count": count,
+                        "total_ms": round(total * 1000, 3),
+                        "avg_ms": round(total * 1000 / count, 3) if count else 0.0,
+                        "max_ms": round(peak * 1000, 3),
+                    }
+                    for name, (count, total, peak) in self._stages.items()
+                }
+            with open(base + ".stages.json", "w") as f:
+                json.dump({
+                    "name": self.name,
+                    "started": datetime.datetime.fromtimestamp(started).isoformat(),
+                    "duration": duration,
+                    "interval": self.interval,
+                    "samples": sum(self._stacks.values()),
+                    "stages": stages,
+                }, f, indent=2)
+            self.last_output = base
+            print(f"{GREEN}Profile written to {base}.folded{RESET}", flush=True)
+        except Exception as e:
+            print(f"{RED}Profile write error: {e}{RESET}", flush=True)
+
+    def install_signal_handler(self, signum=getattr(signal, "SIGUSR2", None), duration=None):
+        """Start a session when ``signum`` is received (main thread only)."""
+        if signum is None:
+            return False
+        try:
+            signal.signal(signum, lambda *_: self.start(duration))
+            return True
+        except (ValueError, OSError) as e:
+            print(f"{YELLOW}Profiler signal handler not installed: {e}{RESET}", flush=True)
+            return False
@@ -7,6 +7,9 @@ import json
 import time
 import struct
 
+from profiler import SamplingProfiler
+from rollups import RollupStore, source_path
+
 # ANSI color codes for terminal output
 RESET = '\033[0m'
 GREEN = '\033[92m'
@@ -17,6 +20,8 @@ MAGENTA = '\033[95m'
 
 log_sources = {}
 current_source = None
+profiler = SamplingProfiler("tcp_server")
+rollup_store = RollupStore()
 
 def get_wifi_ip():
     try:
@@ -41,14 +46,44 @@ def save_log_to_file(imei, log_entry):
         log_dir = "logs"
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, f"{imei}.log")
-        with open(log_file, "a") as f:
-            f.write(log_entry + "\n")
+        with profiler.stage("write"):
+            with open(log_file, "a") as f:
+                f.write(log_entry + "\n")
         print(f"{GREEN}Log saved to {MAGENTA}{log_file}{RESET}")
         return True
     except Exception as e:
         print(f"{RED}File save error: {e}{RESET}")
         return False
 
+def format_log_entry(log_data):
+    # Build timestamp
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Build log parts (preserving original logic)
+    log_parts = [f"{timestamp} - [{log_data.get('level', 'UNKNOWN').upper()}]"]
+    
+    # Add file:line if both are valid (not "UNKNOWN" or line is not 0)
+    file_part = log_data.get('file', 'UNKNOWN')
+    line_part = log_data.get('line', 'UNKNOWN')
+    if file_part != 'UNKNOWN' and line_part != 'UNKNOWN' and str(line_part) != '0':
+        log_parts.append(f"{file_part}:{line_part}")
+    
+    # Add function if valid (not "UNKNOWN")
+    function_part = log_data.get('function', 'UNKNOWN')
+    if function_part != 'UNKNOWN':
+        log_parts.append(function_part)
+    
+    # Always add data (even if UNKNOWN)
+    data_part = log_data.get('data', 'UNKNOWN')
+    log_parts.append(data_part)
+    
+    # Join all valid parts
+    log_entry = " - ".join(log_parts)
+    
+    # Remove the unwanted parts (preserving original logic)
+    log_entry = log_entry.replace(" - UNKNOWN:0", "").replace(" - UNKNOWN", "")
+    return log_entry
+
 def handle_client(client_socket, address):
     print(f"{CYAN}New connection from {address}{RESET}")
     buffer = ""
@@ -78,37 +113,14 @@ def handle_client(client_socket, address):
                 
                 try:
                     # Try to parse as JSON
-                    log_data = json.loads(raw_message)
+                    with profiler.stage("parse"):
+                        log_data = json.loads(raw_message)
                     
                     # Extract IMEI using original logic
                     imei = log_data.get("IMEI") or extract_imei(raw_message) or f"Unknown_{address[0]}"
                     
-                    # Build timestamp
-                    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    # Build log parts (preserving original logic)
-                    log_parts = [f"{timestamp} - [{log_data.get('level', 'UNKNOWN').upper()}]"]
-                    
-                    # Add file:line if both are valid (not "UNKNOWN" or line is not 0)
-                    file_part = log_data.get('file', 'UNKNOWN')
-                    line_part = log_data.get('line', 'UNKNOWN')
-                    if file_part != 'UNKNOWN' and line_part != 'UNKNOWN' and str(line_part) != '0':
-                        log_parts.append(f"{file_part}:{line_part}")
-                    
-                    # Add function if valid (not "UNKNOWN")
-                    function_part = log_data.get('function', 'UNKNOWN')
-                    if function_part != 'UNKNOWN':
-                        log_parts.append(function_part)
-                    
-                    # Always add data (even if UNKNOWN)
-                    data_part = log_data.get('data', 'UNKNOWN')
-                    log_parts.append(data_part)
-                    
-                    # Join all valid parts
-                    log_entry = " - ".join(log_parts)
-                    
-                    # Remove the unwanted parts (preserving original logic)
-                    log_entry = log_entry.replace(" - UNKNOWN:0", "").replace(" - UNKNOWN", "")
+                    with profiler.stage("format"):
+                        log_entry = format_log_entry(log_data)
                     
                     # Add to log sources (preserving original logic)
                     if imei not in log_sources:
@@ -117,6 +129,7 @@ def handle_client(client_socket, address):
                     
                     log_sources[imei].append(log_entry)
                     save_log_to_file(imei, log_entry)
+                    rollup_store.record(imei, log_data.get('level'), len(log_entry.encode('utf-8')) + 1)
                     
                 except json.JSONDecodeError:
                     # Handle malformed JSON (preserving original error handling)
@@ -154,6 +167,7 @@ def tcp_server(host, port):
         
         sock.bind((host, port))
         sock.listen(5)
+        rollup_store.persist_to(source_path("tcp"))
         print(f"{GREEN}Server started successfully{RESET}")
         
         while True:
@@ -175,6 +189,7 @@ def tcp_server(host, port):
 if __name__ == "__main__":
     HOST = '127.0.0.1'
     PORT = 8000
+    profiler.install_signal_handler()
     try:
         tcp_server(HOST, PORT)
     except KeyboardInterrupt:
@@ -6,6 +6,9 @@ import time
 import re
 import os
 
+from profiler import SamplingProfiler
+from rollups import RollupStore, source_path
+
 # ANSI color codes (fallback if curses isn't available)
 RESET = '\033[0m'
 GREEN = '\033[92m'
@@ -15,6 +18,8 @@ RED = '\033[91m'
 log_sources = {}  # Dictionary to store logs by source address
 current_source = None
 screen = None
+profiler = SamplingProfiler("udp_server")
+rollup_store = RollupStore()
 
 
 def get_wifi_ip_netifaces():
@@ -55,27 +60,38 @@ def save_log_to_file(imei, log_entry):
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
     log_file = os.path.join(log_dir, f"{imei}.log")
-    with open(log_file, "a") as f:
-        f.write(log_entry + "\n")
+    with profiler.stage("write"):
+        with open(log_file, "a") as f:
+            f.write(log_entry + "\n")
+
+def extract_level(message):
+    """Extracts the [LEVEL] tag from the log message, if any."""
+    match = re.search(r'\[([A-Za-z]+)\]', message)
+    if match:
+        return match.group(1)
+    return None
 
 def handle_client(data, address):
     """Handles incoming UDP log messages and stores them."""
     print(f"Received data from {address}: {data}") # print the raw data.
     try:
-        message = data.decode('utf-8').strip()
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        imei = extract_imei(message)
-        if imei is None:
-            imei = f"Unknown_{address}"
-        else:
-            # Remove the IMEI from the message
-            message = re.sub(r'IMEI:([^\s]+)', '', message).strip()
-        log_entry = f"{timestamp} - {message}"
+        with profiler.stage("parse"):
+            message = data.decode('utf-8').strip()
+            imei = extract_imei(message)
+            if imei is None:
+                imei = f"Unknown_{address[0]}"
+            else:
+                # Remove the IMEI from the message
+                message = re.sub(r'IMEI:([^\s]+)', '', message).strip()
+
+        with profiler.stage("format"):
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            log_entry = f"{timestamp} - {message}"
 
         if imei not in log_sources:
             log_sources[imei] = []
         log_sources[imei].append(log_entry)
+        rollup_store.record(imei, extract_level(message), len(log_entry.encode('utf-8')) + 1)
         print("WRITING: ",imei," - ",log_entry)
         update_screen()
 
@@ -101,6 +117,7 @@ def udp_server(host, port):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.bind((host, port))
         print(f"UDP server listening on {host}:{port}",flush=True)
+        rollup_store.persist_to(source_path("udp"))
         print("Server binded",flush=True) #add this line
 
         while True:
@@ -204,6 +221,7 @@ def main(stdscr):
 if __name__ == "__main__":
     HOST = '0.0.0.0'
     PORT = 514
+    profiler.install_signal_handler()
 
     try:
         curses.wrapper(main)
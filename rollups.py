@@ -0,0 +1,392 @@
+import os
+import time
+import struct
+import threading
+from array import array
+
+# ANSI color codes for terminal output
+RESET = '\033[0m'
+GREEN = '\033[92m'
+RED = '\033[91m'
+
+STATS_DIR = os.environ.get("CANARIN_STATS_DIR", "stats")
+FLUSH_INTERVAL = float(os.environ.get("CANARIN_STATS_FLUSH_INTERVAL", "60"))
+RELOAD_INTERVAL = float(os.environ.get("CANARIN_STATS_RELOAD_INTERVAL", "10"))
+# Devices silent for longer than this are dropped, as is the least recently seen
+# device once MAX_DEVICES is exceeded (each device costs ~20 KB)
+IDLE_SECONDS = float(os.environ.get("CANARIN_STATS_IDLE_DAYS", "7")) * 86400
+MAX_DEVICES = int(os.environ.get("CANARIN_STATS_MAX_DEVICES", "50000"))
+
+# Binary file layout (native byte order, the file never leaves the host):
+#   MAGIC, u32 device count, then per device:
+#   u16 IMEI length, IMEI, f64 last seen, then per resolution in RESOLUTIONS order:
+#   u16 row count n, n i64 bucket starts, n * FIELDS u64 counters
+MAGIC = b"CRLROLL1"
+# IMEIs are 15 digits; longer keys come from malformed messages and are truncated
+MAX_KEY_BYTES = 255
+
+LEVELS = ("ERROR", "WARNING", "INFO", "DEBUG", "NOTICE", "OTHER")
+LEVEL_INDEX = {level: i for i, level in enumerate(LEVELS)}
+BYTES_INDEX = len(LEVELS)
+FIELDS = len(LEVELS) + 1
+
+# name -> (seconds per bucket, number of buckets kept)
+RESOLUTIONS = {
+    "minute": (60, 180),
+    "hour": (3600, 72),
+    "day": (86400, 60),
+}
+
+
+def normalize_level(level):
+    level = (level or "").upper()
+    if level == "WARN":
+        level = "WARNING"
+    return level if level in LEVEL_INDEX else "OTHER"
+
+
+def normalize_imei(imei):
+    """Return ``imei`` as a string key that fits in the file's u16-prefixed key field."""
+    key = str(imei)
+    encoded = key.encode("utf-8", errors="replace")
+    if len(encoded) > MAX_KEY_BYTES:
+        key = encoded[:MAX_KEY_BYTES].decode("utf-8", errors="ignore")
+    return key
+
+
+class Series:
+    """Fixed-size ring buffer of per-bucket counters.
+
+    ``stamps[i]`` holds the start time of the bucket currently stored in slot
+    ``i``; a slot whose stamp does not match the bucket being written is stale
+    and gets zeroed before reuse. ``counts`` is a flat array of ``FIELDS``
+    counters per slot: one per level followed by the byte count.
+    """
+
+    __slots__ = ("step", "slots", "stamps", "counts")
+
+    def __init__(self, step, slots):
+        self.step = step
+        self.slots = slots
+        self.stamps = array("q", bytes(8 * slots))
+        self.counts = array("Q", bytes(8 * slots * FIELDS))
+
+    def _slot(self, start):
+        i = (start // self.step) % self.slots
+        if self.stamps[i] != start:
+            self.stamps[i] = start
+            base = i * FIELDS
+            for j in range(FIELDS):
+                self.counts[base + j] = 0
+        return i * FIELDS
+
+    def add(self, now, level_index, nbytes):
+        base = self._slot(int(now) - int(now) % self.step)
+        self.counts[base + level_index] += 1
+        self.counts[base + BYTES_INDEX] += nbytes
+
+    def merge(self, other):
+        for i in range(other.slots):
+            start = other.stamps[i]
+            if not start:
+                continue
+            j = (start // self.step) % self.slots
+            if self.stamps[j] > start:
+                continue
+            base = self._slot(start)
+            for k in range(FIELDS):
+                self.counts[base + k] += other.counts[i * FIELDS + k]
+
+    def points(self, now, limit=None):
+        """Return a dense, oldest-first list of ``(start, level_counts, bytes)``."""
+        current = int(now) - int(now) % self.step
+        count = self.slots if limit is None else min(limit, self.slots)
+        result = []
+        for n in range(count - 1, -1, -1):
+            start = current - n * self.step
+            i = (start // self.step) % self.slots
+            if self.stamps[i] == start:
+                row = self.counts[i * FIELDS:(i + 1) * FIELDS]
+                result.append((start, dict(zip(LEVELS, row[:BYTES_INDEX])), row[BYTES_INDEX]))
+            else:
+                result.append((start, dict.fromkeys(LEVELS, 0), 0))
+        return result
+
+    def totals(self, now, limit):
+        """Sum the counters of the last ``limit`` buckets; returns ``(per_level, bytes)``."""
+        current = int(now) - int(now) % self.step
+        oldest = current - (min(limit, self.slots) - 1) * self.step
+        sums = [0] * FIELDS
+        for i, start in enumerate(self.stamps):
+            if oldest <= start <= current:
+                base = i * FIELDS
+                for k in range(FIELDS):
+                    sums[k] += self.counts[base + k]
+        return dict(zip(LEVELS, sums[:BYTES_INDEX])), sums[BYTES_INDEX]
+
+    def encode(self, now):
+        """Serialize only the buckets still inside the ring's time span."""
+        oldest = (int(now) - int(now) % self.step) - (self.slots - 1) * self.step
+        rows = [i for i, start in enumerate(self.stamps) if start >= oldest]
+        stamps = array("q", [self.stamps[i] for i in rows])
+        counts = array("Q")
+        for i in rows:
+            counts.extend(self.counts[i * FIELDS:(i + 1) * FIELDS])
+        return struct.pack("=H", len(rows)) + stamps.tobytes() + counts.tobytes()
+
+    def add_rows(self, stamps, counts):
+        """Add decoded buckets; a slot holding a newer bucket is left alone."""
+        for j, start in enumerate(stamps):
+            i = (start // self.step) % self.slots
+            if self.stamps[i] > start:
+                continue
+            base = self._slot(start)
+            for k in range(FIELDS):
+                self.counts[base + k] += counts[j * FIELDS + k]
+
+
+class DeviceRollup:
+    __slots__ = ("series", "last_seen")
+
+    def __init__(self):
+        self.series = {name: Series(step, slots) for name, (step, slots) in RESOLUTIONS.items()}
+        self.last_seen = 0.0
+
+    def add(self, now, level_index, nbytes):
+        self.last_seen = max(self.last_seen, now)
+        for series in self.series.values():
+            series.add(now, level_index, nbytes)
+
+
+class RollupStore:
+    """Thread-safe per-IMEI rollups of message counts by level and bytes."""
+
+    def __init__(self, idle_seconds=IDLE_SECONDS, max_devices=MAX_DEVICES):
+        self.devices = {}
+        self.idle_seconds = idle_seconds
+        self.max_devices = max_devices
+        self._lock = threading.Lock()
+
+    def record(self, imei, level, nbytes, now=None):
+        now = time.time() if now is None else now
+        level_index = LEVEL_INDEX[normalize_level(level)]
+        imei = normalize_imei(imei)
+        with self._lock:
+            rollup = self.devices.get(imei)
+            if rollup is None:
+                rollup = self.devices[imei] = DeviceRollup()
+            rollup.add(now, level_index, nbytes)
+
+    def device_stats(self, imei, resolution="minute", now=None):
+        now = time.time() if now is None else now
+        rollup = self.devices.get(normalize_imei(imei))
+        if rollup is None or resolution not in rollup.series:
+            return None
+        series = rollup.series[resolution]
+        return {
+            "imei": imei,
+            "resolution": resolution,
+            "step": series.step,
+            "points": [
+                {"start": start, "messages": levels, "bytes": nbytes}
+                for start, levels, nbytes in series.points(now)
+            ],
+        }
+
+    def fleet_summary(self, now=None, minutes=60, top=10):
+        """Totals over the last ``minutes`` across all devices."""
+        now = time.time() if now is None else now
+        messages = dict.fromkeys(LEVELS, 0)
+        total_bytes = 0
+        per_device = []
+        for imei, rollup in self.devices.items():
+            device_messages, device_bytes = rollup.series["minute"].totals(now, minutes)
+            count = sum(device_messages.values())
+            if not count:
+                continue
+            for level, value in device_messages.items():
+                messages[level] += value
+            total_bytes += device_bytes
+            per_device.append((count, imei, device_messages["ERROR"], device_bytes))
+        per_device.sort(reverse=True)
+        total = sum(messages.values())
+        return {
+            "window_minutes": minutes,
+            "devices": len(self.devices),
+            "active_devices": len(per_device),
+            "messages": total,
+            "messages_by_level": messages,
+            "bytes": total_bytes,
+            "error_rate": round(messages["ERROR"] / total, 4) if total else 0.0,
+            "top_devices": [
+                {"imei": imei, "messages": count, "errors": errors, "bytes": nbytes}
+                for count, imei, errors, nbytes in per_device[:top]
+            ],
+        }
+
+    def evict(self, now=None):
+        """Drop idle devices and cap the number of devices; returns how many were dropped."""
+        now = time.time() if now is None else now
+        with self._lock:
+            idle = [imei for imei, rollup in self.devices.items()
+                    if now - rollup.last_seen > self.idle_seconds]
+            for imei in idle:
+                del self.devices[imei]
+            excess = len(self.devices) - self.max_devices
+            if excess > 0:
+                oldest = sorted(self.devices, key=lambda imei: self.devices[imei].last_seen)[:excess]
+                for imei in oldest:
+                    del self.devices[imei]
+                idle.extend(oldest)
+        return len(idle)
+
+    def save(self, path, now=None):
+        now = time.time() if now is None else now
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with self._lock:
+            imeis = list(self.devices)
+        count = 0
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + b"\0\0\0\0")
+            for imei in imeis:
+                # Encode one device at a time so ingest is never blocked for long
+                with self._lock:
+                    rollup = self.devices.get(imei)
+                    if rollup is None:
+                        continue
+                    blobs = [series.encode(now) for series in rollup.series.values()]
+                    last_seen = rollup.last_seen
+                key = str(imei).encode("utf-8", errors="replace")
+                if len(key) > MAX_KEY_BYTES:
+                    continue  # only reachable if devices was filled without record()
+                f.write(struct.pack("=H", len(key)) + key + struct.pack("=d", last_seen))
+                for blob in blobs:
+                    f.write(blob)
+                count += 1
+            f.seek(len(MAGIC))
+            f.write(struct.pack("=I", count))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a rollup file")
+        offset = len(MAGIC)
+        (count,) = struct.unpack_from("=I", data, offset)
+        offset += 4
+        for _ in range(count):
+            (key_len,) = struct.unpack_from("=H", data, offset)
+            offset += 2
+            imei = data[offset:offset + key_len].decode("utf-8")
+            offset += key_len
+            (last_seen,) = struct.unpack_from("=d", data, offset)
+            offset += 8
+            decoded = []
+            for _ in RESOLUTIONS:
+                (rows,) = struct.unpack_from("=H", data, offset)
+                offset += 2
+                stamps = array("q")
+                stamps.frombytes(data[offset:offset + 8 * rows])
+                offset += 8 * rows
+                counts = array("Q")
+                counts.frombytes(data[offset:offset + 8 * rows * FIELDS])
+                offset += 8 * rows * FIELDS
+                decoded.append((stamps, counts))
+            with self._lock:
+                rollup = self.devices.get(imei)
+                if rollup is None:
+                    rollup = self.devices[imei] = DeviceRollup()
+                rollup.last_seen = max(rollup.last_seen, last_seen)
+                for series, (stamps, counts) in zip(rollup.series.values(), decoded):
+                    series.add_rows(stamps, counts)
+
+    def persist_to(self, path, interval=FLUSH_INTERVAL):
+        """Load ``path`` if it exists, then keep saving the store back to it."""
+        if os.path.exists(path):
+            try:
+                self.load(path)
+                print(f"{GREEN}Loaded stats from {path}{RESET}", flush=True)
+            except Exception as e:
+                print(f"{RED}Stats load error: {e}{RESET}", flush=True)
+        return self.start_flusher(path, interval)
+
+    def start_flusher(self, path, interval=FLUSH_INTERVAL):
+        """Persist the store to ``path`` every ``interval`` seconds."""
+        def flush_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict()
+                    self.save(path)
+                except Exception as e:
+                    print(f"{RED}Stats save error: {e}{RESET}", flush=True)
+
+        thread = threading.Thread(target=flush_loop, name="rollup-flusher", daemon=True)
+        thread.start()
+        return thread
+
+
+def source_path(source, stats_dir=STATS_DIR):
+    return os.path.join(stats_dir, f"rollups-{source}.bin")
+
+
+def _source_files(stats_dir):
+    if not os.path.isdir(stats_dir):
+        return {}
+    return {
+        entry.path: entry.stat().st_mtime_ns
+        for entry in os.scandir(stats_dir)
+        if entry.name.startswith("rollups-") and entry.name.endswith(".bin")
+    }
+
+
+def load_all(stats_dir=STATS_DIR):
+    """Merge the persisted rollups of every ingest source into one store."""
+    store = RollupStore(idle_seconds=float("inf"), max_devices=float("inf"))
+    for path in _source_files(stats_dir):
+        try:
+            store.load(path)
+        except Exception as e:
+            print(f"{RED}Stats load error for {path}: {e}{RESET}", flush=True)
+    return store
+
+
+class RollupReader:
+    """Read-only merged view of the persisted rollups for the web app.
+
+    A background thread reloads the store (and the default fleet summary)
+    when one of the source files changes, then swaps the references, so
+    requests never wait for a load.
+    """
+
+    def __init__(self, stats_dir=STATS_DIR, interval=RELOAD_INTERVAL):
+        self.stats_dir = stats_dir
+        self.interval = interval
+        self.store = RollupStore()
+        self.summary = self.store.fleet_summary()
+        self._mtimes = {}
+        self._thread = None
+
+    def refresh(self):
+        mtimes = _source_files(self.stats_dir)
+        if mtimes == self._mtimes:
+            return False
+        store = load_all(self.stats_dir)
+        summary = store.fleet_summary()
+        self.store, self.summary, self._mtimes = store, summary, mtimes
+        return True
+
+    def start(self):
+        def reload_loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"{RED}Stats reload error: {e}{RESET}", flush=True)
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=reload_loop, name="rollup-reader", daemon=True)
+        self._thread.start()
+        return self
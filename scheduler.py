@@ -0,0 +1,128 @@
+import time
+import random
+import asyncio
+import logging
+
+
+class Job:
+    """A coroutine function run periodically by ``JobScheduler``."""
+
+    def __init__(self, name, func, interval, timeout=None, jitter=0.0, initial_delay=0.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter
+        self.initial_delay = initial_delay
+        self.task = None
+
+        # Run statistics
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_started = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "last_started": self.last_started,
+            "last_duration": self.last_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else None,
+            "max_duration": self.max_duration,
+            "last_error": self.last_error,
+        }
+
+
+class JobScheduler:
+    """Runs each job on its own fixed-rate interval in its own asyncio task.
+
+    A slow job only delays itself: every job sleeps until ``interval`` seconds
+    after its previous start (plus up to ``jitter`` seconds), is cancelled
+    after ``timeout`` seconds, and never runs concurrently with itself. An
+    explicit ``trigger()`` while a run is in flight waits for that run instead
+    of starting a second one.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger("canarin_scheduler")
+        self.jobs = {}
+        self._loops = []
+
+    def add(self, name, func, interval, timeout=None, jitter=0.0, initial_delay=0.0):
+        job = Job(name, func, interval, timeout, jitter, initial_delay)
+        self.jobs[name] = job
+        return job
+
+    async def _execute(self, job):
+        job.last_started = time.time()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(job.func(), job.timeout)
+        except asyncio.TimeoutError:
+            job.timeouts += 1
+            job.last_error = f"timed out after {job.timeout}s"
+            self.logger.warning(f"Job {job.name} timed out after {job.timeout}s")
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            self.logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            duration = time.monotonic() - start
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+
+    def trigger(self, name):
+        """Start ``name`` now unless it is already running; returns its task."""
+        job = self.jobs[name]
+        if job.running:
+            job.skipped += 1
+        else:
+            job.task = asyncio.create_task(self._execute(job), name=f"job:{job.name}")
+        return job.task
+
+    async def run_once(self, name):
+        await asyncio.shield(self.trigger(name))
+
+    async def _job_loop(self, job):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + job.initial_delay
+        while True:
+            delay = next_run - loop.time() + (random.uniform(0, job.jitter) if job.jitter else 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_run = loop.time() + job.interval
+            await asyncio.shield(self.trigger(job.name))
+
+    async def run(self):
+        self._loops = [
+            asyncio.create_task(self._job_loop(job), name=f"schedule:{job.name}")
+            for job in self.jobs.values()
+        ]
+        try:
+            await asyncio.gather(*self._loops)
+        finally:
+            for task in self._loops:
+                task.cancel()
+            for job in self.jobs.values():
+                if job.running:
+                    job.task.cancel()
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
@@ -6,12 +6,17 @@ import time
 import glob
 import json
 import logging
+import signal
 import asyncio
 from datetime import datetime, timedelta
 from pathlib import Path
 import aiohttp
 import re
 
+from profiler import SamplingProfiler
+from error_aggregator import ErrorAggregator
+from scheduler import JobScheduler
+
 class CanarinLogMonitor:
     def __init__(self, bot_token, chat_id, log_directory="logs"):
         self.bot_token = bot_token
@@ -35,7 +40,17 @@ class CanarinLogMonitor:
             r"unable\.connect",
         ]
 
+        # Repeated errors are grouped by fingerprint and summarised per window
+        self.error_aggregator = ErrorAggregator(
+            window=int(os.environ.get("CANARIN_ERROR_WINDOW", "300")),
+            summary_interval=int(os.environ.get("CANARIN_ERROR_SUMMARY_INTERVAL", "300")),
+            max_fingerprints=int(os.environ.get("CANARIN_ERROR_MAX_FINGERPRINTS", "1000")),
+        )
+
+        self.profiler = SamplingProfiler("telegram_monitor")
+
         self.setup_logging()
+        self.setup_scheduler()
 
     def setup_logging(self):
         logging.basicConfig(
@@ -48,6 +63,15 @@ class CanarinLogMonitor:
         )
         self.logger = logging.getLogger("canarin_monitor")
 
+    def setup_scheduler(self):
+        # Each job runs on its own interval so a slow job never delays the others
+        self.scheduler = JobScheduler(self.logger)
+        self.scheduler.add("poll_commands", self.poll_commands, interval=1, timeout=45)
+        self.scheduler.add("monitor_logs", self.monitor_all_logs_once, interval=5, timeout=60, jitter=0.5)
+        self.scheduler.add("error_summaries", self.send_error_summaries, interval=30, timeout=30)
+        self.scheduler.add("device_activity", self.check_device_activity, interval=10, timeout=60, jitter=1)
+        self.scheduler.add("server_health", self.check_server_health, interval=15, timeout=30, jitter=1)
+
     def _is_excluded(self, device_name: str) -> bool:
         return device_name in self.excluded_devices
 
@@ -96,10 +120,14 @@ class CanarinLogMonitor:
             await self.handle_devices_command(chat_id, message_id)
         elif text == "/status":
             await self.handle_status_command(chat_id, message_id)
+        elif text == "/errors":
+            await self.handle_errors_command(chat_id, message_id)
+        elif text == "/jobs":
+            await self.handle_jobs_command(chat_id, message_id)
         elif text.startswith("/ping"):
             await self.send_telegram_message("Pong 🏓", reply_to_message_id=message_id, chat_id=chat_id)
         else:
-            await self.send_telegram_message("Commands: /devices, /status, /ping", reply_to_message_id=message_id, chat_id=chat_id)
+            await self.send_telegram_message("Commands: /devices, /status, /errors, /jobs, /ping", reply_to_message_id=message_id, chat_id=chat_id)
 
     def list_log_files(self):
         pattern = os.path.join(self.log_directory, "*.log")
@@ -138,7 +166,7 @@ class CanarinLogMonitor:
 
     async def handle_status_command(self, chat_id, reply_to_message_id):
         try:
-            await self.check_server_health()
+            await self.scheduler.run_once("server_health")
             online_count = sum(1 for f in self.list_log_files()
                                if not self._is_excluded(os.path.basename(f).replace(".log", "")) and
                                (datetime.now() - datetime.fromtimestamp(os.stat(f).st_mtime)) < timedelta(minutes=10))
@@ -150,6 +178,34 @@ class CanarinLogMonitor:
         except Exception as e:
             self.logger.error(f"Error in /status: {e}")
 
+    async def handle_errors_command(self, chat_id, reply_to_message_id):
+        try:
+            top = self.error_aggregator.top()
+            if not top:
+                await self.send_telegram_message("No active errors.", reply_to_message_id, chat_id)
+                return
+            minutes = max(1, self.error_aggregator.window // 60)
+            lines = [f"×{count} `{device}`\n`{key[:120]}`" for count, device, key, total in top]
+            message = f"🔥 Top errors (last {minutes} min)\n" + "\n".join(lines) + "\n🔗 Server: canarin-sensors.com"
+            await self.send_telegram_message(message, reply_to_message_id, chat_id)
+        except Exception as e:
+            self.logger.error(f"Error in /errors: {e}")
+
+    async def handle_jobs_command(self, chat_id, reply_to_message_id):
+        try:
+            lines = []
+            for name, stats in self.scheduler.stats().items():
+                avg = f"{stats['avg_duration']:.2f}s" if stats["avg_duration"] is not None else "-"
+                lines.append(
+                    f"`{name}` every {stats['interval']}s - runs {stats['runs']}, "
+                    f"avg {avg}, max {stats['max_duration']:.2f}s, "
+                    f"failed {stats['failures']}, timeouts {stats['timeouts']}, skipped {stats['skipped']}"
+                )
+            message = "⏱️ Jobs\n" + "\n".join(lines)
+            await self.send_telegram_message(message, reply_to_message_id, chat_id)
+        except Exception as e:
+            self.logger.error(f"Error in /jobs: {e}")
+
     async def monitor_log_errors(self, log_file_path):
         device_name = os.path.basename(log_file_path).replace(".log", "")
         if self._is_excluded(device_name):
@@ -166,29 +222,63 @@ class CanarinLogMonitor:
                     self.file_positions[log_file_path] = 0
 
             if os.path.exists(log_file_path):
-                with open(log_file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    f.seek(self.file_positions[log_file_path])
-                    new_lines = f.readlines()
-                    self.file_positions[log_file_path] = f.tell()
-
-                for line in new_lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    for pattern in self.error_patterns:
-                        if re.search(pattern, line, re.IGNORECASE):
-                            message = (
-                                f"🔥 `{device_name}`\n"
-                                f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                                f"❌ Error:\n`{line[:200]}...`\n"
-                                f"🔗 Server: canarin-sensors.com"
-                            )
-                            await self.send_telegram_message(message)
-                            self.logger.warning(f"Error detected in {device_name}: {line[:100]}")
-                            break
+                with self.profiler.stage("read"):
+                    with open(log_file_path, "rb") as f:
+                        f.seek(self.file_positions[log_file_path])
+                        new_lines = f.readlines()
+
+                # The position only moves past a line once it has been handled,
+                # so lines left over when the job times out are read again next run
+                done = 0
+                try:
+                    for raw in new_lines:
+                        if not raw.endswith(b"\n"):
+                            break  # partial line still being written
+                        message = self._check_log_line(device_name, raw.decode("utf-8", errors="ignore").strip())
+                        self.file_positions[log_file_path] += len(raw)
+                        done += 1
+                        if message:
+                            with self.profiler.stage("send"):
+                                # An alert already counted by the aggregator must go out even on timeout
+                                await asyncio.shield(self.send_telegram_message(message))
+                except asyncio.CancelledError:
+                    self.logger.warning(
+                        f"Monitoring {device_name} interrupted, {len(new_lines) - done} lines deferred to next run"
+                    )
+                    raise
         except Exception as e:
             self.logger.error(f"Error monitoring {log_file_path}: {str(e)}")
 
+    def _check_log_line(self, device_name, line):
+        """Return the alert to send for ``line``, or None."""
+        if not line:
+            return None
+        with self.profiler.stage("match"):
+            matched = any(re.search(pattern, line, re.IGNORECASE) for pattern in self.error_patterns)
+        if not (matched and self.error_aggregator.record(device_name, line)):
+            return None
+        self.logger.warning(f"Error detected in {device_name}: {line[:100]}")
+        return (
+            f"🔥 `{device_name}`\n"
+            f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"❌ Error:\n`{line[:200]}...`\n"
+            f"🔗 Server: canarin-sensors.com"
+        )
+
+    async def send_error_summaries(self):
+        try:
+            for device_name, key, count, minutes, sample in self.error_aggregator.due_summaries():
+                message = (
+                    f"🔁 `{device_name}`\n"
+                    f"×{count} in {minutes} min\n"
+                    f"❌ Error:\n`{sample[:200]}...`\n"
+                    f"🔗 Server: canarin-sensors.com"
+                )
+                await self.send_telegram_message(message)
+                self.logger.warning(f"Repeated error in {device_name} x{count} in {minutes} min: {key[:100]}")
+        except Exception as e:
+            self.logger.error(f"Error sending error summaries: {e}")
+
     async def check_device_activity(self):
         try:
             log_files = self.list_log_files()
@@ -309,23 +399,24 @@ class CanarinLogMonitor:
 
     async def run(self):
         self.logger.info("Starting CanarinLogMonitor...")
-        while True:
-            try:
-                await asyncio.gather(
-                    self.poll_commands(),
-                    self.check_device_activity(),
-                    self.monitor_all_logs_once(),
-                    self.check_server_health(),
-                )
-            except Exception as e:
-                self.logger.error(f"Main loop error: {e}")
-            await asyncio.sleep(5)
+        self.install_profiler()
+        await self.scheduler.run()
+
+    def install_profiler(self):
+        # SIGUSR2 starts a sampling session; samples are tagged with the running task name
+        loop = asyncio.get_running_loop()
+        self.profiler.register_loop(loop)
+        try:
+            loop.add_signal_handler(signal.SIGUSR2, self.profiler.start)
+        except (NotImplementedError, AttributeError, RuntimeError) as e:
+            self.logger.warning(f"Profiler signal handler not installed: {e}")
 
     async def monitor_all_logs_once(self):
         tasks = []
         for logfile in self.list_log_files():
             # monitor_log_errors itself will skip excluded devices
-            tasks.append(self.monitor_log_errors(logfile))
+            device_name = os.path.basename(logfile).replace(".log", "")
+            tasks.append(asyncio.create_task(self.monitor_log_errors(logfile), name=f"monitor:{device_name}"))
         if tasks:
             await asyncio.gather(*tasks)
 
@@ -0,0 +1,66 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from error_aggregator import ErrorAggregator, fingerprint
+
+
+def test_fingerprint_strips_variable_parts():
+    a = fingerprint("2024-05-01 10:00:00 - [ERROR] timeout after 1500 ms on 0x1f3a")
+    b = fingerprint("2024-05-02 11:30:12 - [ERROR] timeout after 2000 ms on 0xbeef")
+    assert a == b
+
+
+def test_first_occurrence_alerts_and_repeats_are_summarised():
+    agg = ErrorAggregator(window=300, summary_interval=300)
+    assert agg.record("dev", "[ERROR] modem reset 1", now=0)
+    for i in range(5):
+        assert not agg.record("dev", f"[ERROR] modem reset {i + 2}", now=10 + i)
+
+    assert agg.due_summaries(now=100) == []
+    (device, _, count, minutes, sample), = agg.due_summaries(now=300)
+    assert (device, count, minutes, sample) == ("dev", 5, 5, "[ERROR] modem reset 6")
+    assert agg.due_summaries(now=310) == []
+
+
+def test_restart_after_quiet_window_alerts_and_flushes_pending():
+    agg = ErrorAggregator(window=300, summary_interval=600)
+    assert agg.record("dev", "[ERROR] sd card full", now=0)
+    assert not agg.record("dev", "[ERROR] sd card full", now=60)
+    assert not agg.record("dev", "[ERROR] sd card full", now=120)
+    # Quiet for longer than the window: alert again, the two repeats are not lost
+    assert agg.record("dev", "[ERROR] sd card full", now=500)
+    (device, _, count, _, _), = agg.due_summaries(now=501)
+    assert (device, count) == ("dev", 2)
+
+
+def test_eviction_never_drops_the_entry_being_recorded():
+    agg = ErrorAggregator(max_fingerprints=3)
+    for name in ("a", "b", "c"):
+        agg.record(name, "[ERROR] retry failed", now=0)
+        agg.record(name, "[ERROR] retry failed", now=1)
+
+    alerts = sum(agg.record("d", "[ERROR] retry failed", now=2 + i) for i in range(100))
+    assert alerts == 1
+    assert len(agg) == 3
+
+    summaries = {device: count for device, _, count, _, _ in agg.due_summaries(now=1000)}
+    assert summaries["a"] == 1  # evicted with a pending repeat, which is kept
+    assert summaries["d"] == 99
+
+
+def test_flushed_summaries_are_bounded_and_merged():
+    agg = ErrorAggregator(window=300, max_fingerprints=2)
+    for round_start in (0, 1000):
+        for i in range(10):
+            agg.record(f"dev{i}", "[ERROR] crc mismatch", now=round_start)
+            agg.record(f"dev{i}", "[ERROR] crc mismatch", now=round_start + 1)
+    assert len(agg._flushed) <= 2
+
+    due = agg.due_summaries(now=2000)
+    # At most the live entries, the merged flushed ones and the catch-all
+    assert len(due) <= 2 * 2 + 1
+    assert sum(count for _, _, count, _, _ in due) == 20
+    assert any(device == "*" for device, _, _, _, _ in due)
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import log_format
+
+SAMPLE_LINES = [
+    "2024-05-01 10:00:00 - [ERROR] Sensor read failed",
+    "    at read_sensor (sensor.c:42)",
+    "2024-05-01 10:00:01 - [WARN] Battery low",
+    "2024-05-01 10:00:02 - [WARNING] Signal weak",
+    "2024-05-01 10:00:03 - [INFO] hello err",
+    "2024-05-01 10:00:04 - [DEBUG] raw frame 0x1f",
+    "",
+    "2024-05-01 10:00:05 - [UNKNOWN] Fatal modem reset",
+    "2024-05-01 10:00:06 - Error processing message from ('10.0.0.1', 5000)",
+    "2024-05-01 10:00:07 - plain message",
+    "continuation of the plain message",
+    "2024-05-01 10:00:08 - [NOTICE] Device rebooted",
+]
+
+EXPECTED = [
+    "error",
+    "error",
+    "warning",
+    "warning",
+    "info",
+    "debug",
+    "error",
+    "error",
+    "info",
+    "info",
+    "info",
+]
+
+
+def viewer_levels(lines):
+    """Run the viewer's detectLogLevel from templates/log.html over ``lines`` with node."""
+    with open(os.path.join(ROOT, "templates", "log.html")) as f:
+        template = f.read()
+    start = template.index("const LEVEL_RULES")
+    end = template.index("\n        }\n", template.index("function detectLogLevel")) + len("\n        }\n")
+    source = template[start:end].replace("{{ level_rules|tojson }}", json.dumps(log_format.viewer_rules()))
+    # Same bookkeeping as LogViewer.appendLines: blank lines are skipped, the level carries over
+    script = source + """
+        const lines = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+        let lastLevel = LEVEL_RULES.default;
+        const levels = [];
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            levels.push(lastLevel = detectLogLevel(line, lastLevel));
+        }
+        console.log(JSON.stringify(levels));
+    """
+    result = subprocess.run(["node", "-e", script], input=json.dumps(lines),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def test_classify():
+    levels = []
+    level = log_format.DEFAULT_LEVEL
+    for line in SAMPLE_LINES:
+        if line.strip():
+            level = log_format.classify(line.encode(), level)
+            levels.append(level)
+    assert levels == EXPECTED
+
+
+def test_parse_levels_accepts_tags():
+    assert log_format.parse_levels("WARN, error,,Info") == {"warning", "error", "info"}
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_viewer_matches_classify():
+    assert viewer_levels(SAMPLE_LINES) == EXPECTED
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+@pytest.mark.parametrize("level", log_format.VIEWER_LEVELS)
+def test_export_matches_viewer_filter(tmp_path, level):
+    path = tmp_path / "device.log"
+    path.write_text("".join(line + "\n" for line in SAMPLE_LINES))
+
+    exported = log_format.export_lines(str(path), path.stat().st_size, None, None, {level}, b"")
+    exported = [line.decode().strip() for line in exported if line.strip()]
+
+    shown = [line.strip() for line in SAMPLE_LINES if line.strip()]
+    shown = [line for line, line_level in zip(shown, viewer_levels(SAMPLE_LINES)) if line_level == level]
+    assert exported == shown
+
+
+def test_export_keeps_continuations_with_their_entry(tmp_path):
+    path = tmp_path / "device.log"
+    path.write_text("".join(line + "\n" for line in SAMPLE_LINES))
+    lines = list(log_format.export_lines(str(path), path.stat().st_size,
+                                         log_format.parse_export_time("2024-05-01 10:00:07"), None, set(), b""))
+    assert [line.decode().rstrip("\n") for line in lines] == SAMPLE_LINES[-3:]
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rollups
+from rollups import RollupStore
+
+NOW = 1_700_000_000.0
+
+
+def fill(store):
+    store.record("356938035643809", "ERROR", 120, now=NOW - 7200)
+    store.record("356938035643809", "warn", 80, now=NOW - 30)
+    store.record("356938035643809", "INFO", 50, now=NOW)
+    store.record("Unknown_10.0.0.7", None, 10, now=NOW - 90000)
+
+
+def test_save_load_round_trip(tmp_path):
+    store = RollupStore()
+    fill(store)
+    path = str(tmp_path / "rollups-tcp.bin")
+    store.save(path, now=NOW)
+
+    loaded = RollupStore()
+    loaded.load(path)
+    assert set(loaded.devices) == set(store.devices)
+    for imei, rollup in store.devices.items():
+        assert loaded.devices[imei].last_seen == rollup.last_seen
+        for resolution in rollups.RESOLUTIONS:
+            assert loaded.device_stats(imei, resolution, now=NOW) == store.device_stats(imei, resolution, now=NOW)
+    assert loaded.fleet_summary(now=NOW) == store.fleet_summary(now=NOW)
+
+
+def test_load_merges_into_existing_counts(tmp_path):
+    store = RollupStore()
+    fill(store)
+    path = str(tmp_path / "rollups-tcp.bin")
+    store.save(path, now=NOW)
+
+    store.load(path)
+    summary = store.fleet_summary(now=NOW)
+    assert summary["messages_by_level"]["INFO"] == 2
+    assert summary["messages_by_level"]["WARNING"] == 2
+
+
+def test_non_string_and_oversized_imeis_do_not_break_save(tmp_path):
+    store = RollupStore()
+    store.record(356938035643809, "INFO", 10, now=NOW)
+    store.record("x" * 70000, "ERROR", 10, now=NOW)
+    store.record("356938035643810", "INFO", 10, now=NOW)
+    path = str(tmp_path / "rollups-tcp.bin")
+    store.save(path, now=NOW)
+
+    loaded = RollupStore()
+    loaded.load(path)
+    assert "356938035643809" in loaded.devices
+    assert "356938035643810" in loaded.devices
+    assert "x" * rollups.MAX_KEY_BYTES in loaded.devices
+    assert loaded.device_stats(356938035643809, now=NOW) is not None
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "rollups-tcp.bin"
+    path.write_bytes(b"not a rollup file")
+    with pytest.raises(ValueError):
+        RollupStore().load(str(path))